@@ -1,8 +1,27 @@
 import requests
-from bs4 import BeautifulSoup
 import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from urllib.parse import urlparse
 
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, requests falls back to the stdlib json module
+    orjson = None
+
+# Liveness checks are pure network wait, so many can be in flight at once
+MAX_WORKERS = 64
+
+# Common SSL/CDN domains, matched as suffixes in a single endswith call
+SKIP_SUFFIXES = ('cloudflaressl.com', 'automattic.com', 'amazonaws.com')
+
+# Shared session for the crt.sh query and the liveness probes
+session = requests.Session()
+
+# Separate pool for the per-protocol probes, two per host worker. A losing probe keeps its
+# thread until it finishes or times out, so later hosts' probes can briefly queue behind it.
+probe_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS * 2)
+
 def is_valid_subdomain(subdomain, main_domain):
     # Remove any trailing dots and convert to lowercase
     subdomain = subdomain.rstrip('.').lower()
@@ -13,26 +32,32 @@ def is_valid_subdomain(subdomain, main_domain):
         return False
         
     # Skip common SSL/CDN domains
-    skip_domains = ['cloudflaressl.com', 'automattic.com', 'amazonaws.com']
-    if any(skip in subdomain for skip in skip_domains):
+    if subdomain.endswith(SKIP_SUFFIXES):
         return False
     
     # Check if it's actually a subdomain of our main domain
     return subdomain.endswith('.' + main_domain) or subdomain == main_domain
 
-# Function to check if the subdomain is alive using both HTTP and HTTPS
+def probe(url):
+    try:
+        # Send a HEAD request without following redirects, a 3xx already proves the host is up
+        response = session.head(url, timeout=5, allow_redirects=False)
+        # If the response status code is 200-399, the subdomain is alive
+        return 200 <= response.status_code < 400
+    except requests.exceptions.RequestException:
+        return False
+
+# Function to check if the subdomain is alive using both HTTPS and HTTP
 def is_subdomain_alive(subdomain):
-    protocols = ['http://', 'https://']
-    for protocol in protocols:
-        try:
-            # Send a HEAD request to check if the subdomain is alive
-            response = requests.head(f"{protocol}{subdomain}", timeout=5)
-            # If the response status code is 200-399, the subdomain is alive
-            if 200 <= response.status_code < 400:
-                return True
-        except requests.exceptions.RequestException:
-            # Ignore the exception and try the next protocol
-            continue
+    # Probe both protocols at once and report alive on the first one that answers. The
+    # other probe is only cancelled if it has not started, otherwise it runs to completion.
+    pending = {probe_executor.submit(probe, f"{protocol}{subdomain}") for protocol in ('https://', 'http://')}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        if any(future.result() for future in done):
+            for future in pending:
+                future.cancel()
+            return True
     return False
 
 def get_main_domain(url):
@@ -61,52 +86,51 @@ args = parser.parse_args()
 main_domain = get_main_domain(args.url)
 
 # Process the input URL to be used in crt.sh
-target_url = f"https://crt.sh/?q=%.{main_domain}"
+target_url = f"https://crt.sh/?q=%.{main_domain}&output=json"
 
 print("\n[SUBDOMAINS]")
 
 # Send a GET request to crt.sh with the formatted URL
-response = requests.get(target_url)
+response = session.get(target_url)
 
 # Check if the request was successful
 if response.status_code != 200:
     print(f"Failed to retrieve data from crt.sh. Status code: {response.status_code}")
     exit(1)
 
-# Parse the HTML response using BeautifulSoup
-soup = BeautifulSoup(response.content, 'html.parser')
+# Parse the JSON response returned by crt.sh
+try:
+    # crt.sh responses for large domains run to megabytes, where orjson decodes several times faster
+    entries = orjson.loads(response.content) if orjson else response.json()
+except ValueError:
+    print("Failed to parse the JSON response from crt.sh.")
+    exit(1)
+
+# Save the alive subdomains into a .txt file as each check completes
+output_file = f"{main_domain}_alive_subdomains.txt"
 
 # Set to store unique subdomains
 subdomains = set()
 
-# Iterate over each <tr> (table row) in the HTML
-for row in soup.find_all('tr'):
-    # Get all the <td> (table data) elements in the row
-    cells = row.find_all('td')
-    
-    if len(cells) > 4:
-        # The fifth <td> contains the subdomain information
-        subdomain = cells[4].text.strip()
-        
+with open(output_file, 'w') as file, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    futures = {}
+
+    # Each certificate entry lists its identities in name_value, one per line.
+    # Liveness checks start as soon as a subdomain is found, overlapping parse and probe.
+    for entry in entries:
         # Remove wildcards and split on newlines
-        for domain in subdomain.replace('*.', '').split('\n'):
+        for domain in entry.get('name_value', '').replace('*.', '').split('\n'):
             domain = domain.strip().lower()
-            if domain and is_valid_subdomain(domain, main_domain):
+            if domain and domain not in subdomains and is_valid_subdomain(domain, main_domain):
                 subdomains.add(domain)
+                futures[executor.submit(is_subdomain_alive, domain)] = domain
 
-# List to store only alive subdomains
-alive_subdomains = []
-
-# Check each subdomain for liveness via both HTTP and HTTPS
-for subdomain in sorted(subdomains):
-    if is_subdomain_alive(subdomain):
-        print(subdomain)
-        alive_subdomains.append(subdomain)
-
-# Save the alive subdomains into a .txt file
-output_file = f"{main_domain}_alive_subdomains.txt"
-with open(output_file, 'w') as file:
-    for subdomain in alive_subdomains:
-        file.write(f"{subdomain}\n")
+    # Check each subdomain for liveness via both HTTPS and HTTP, writing results as they arrive
+    for future in as_completed(futures):
+        if future.result():
+            subdomain = futures[future]
+            print(subdomain)
+            file.write(f"{subdomain}\n")
+            file.flush()
 
-print(f"[INFO] Alive subdomains saved to {output_file}")
\ No newline at end of file
+print(f"[INFO] Alive subdomains saved to {output_file}")
@@ -1,15 +1,73 @@
 import os
+import hashlib
 import json
+import logging
 import subprocess
 import re
+import shutil
 import argparse
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from tabulate import tabulate
 
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the stdlib json module produces the same documents
+    orjson = None
+
+REGISTRY_URL = os.environ.get("NPM_CONFIG_REGISTRY", "https://registry.npmjs.org").rstrip("/")
+# Kept low to stay clear of the registry's rate limiting
+MAX_WORKERS = 10
+CACHE_DIR = Path.home() / ".cache" / "webpackscan" / "registry"
+# Seconds before a cached packument is revalidated against the registry
+CACHE_TTL = 300
+# Published versions are never reused, so a cached hit for the wanted version lasts longer
+VERSION_HIT_TTL = 24 * 60 * 60
+LOCKFILE_CACHE_DIR = Path.home() / ".cache" / "webpackscan" / "lockfiles"
+# Seconds a resolved lockfile is reused, after which newer transitive releases are picked up
+LOCKFILE_TTL = 24 * 60 * 60
+_SANITIZE_RE = re.compile(r"[^a-zA-Z0-9-_]")
+# Error lines in npm's log output, "npm ERR!" before npm 9 and "npm error" since
+_NPM_ERROR_RE = re.compile(r"npm (?:ERR!|error) .*")
+
+# Per-package diagnostics go through logging so they cost nothing unless --verbose is set
+logger = logging.getLogger("webpackscan")
+
+# Shared session so every registry lookup reuses the same keep-alive connection
+session = requests.Session()
+# One keep-alive socket per worker, so DNS and the TLS handshake are paid once per socket
+# for the whole scan. Rate limiting (429) and transient outages (503) back off and retry.
+session.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 503])
+))
+# Ask for the abbreviated "install" packument, which only carries the fields npm needs to
+# resolve versions and is a fraction of the full document's size. See
+# https://github.com/npm/registry/blob/main/docs/responses/package-metadata.md
+ABBREVIATED_ACCEPT = "application/vnd.npm.install-v1+json"
+session.headers["Accept"] = ABBREVIATED_ACCEPT
+
+def load_json(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def dump_json(obj, indent=False):
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode()
+
+
 def read_input_json(file_path):
     try:
-        with open(file_path, "r") as f:
-            return json.load(f)
+        return load_json(Path(file_path).read_bytes())
     except FileNotFoundError:
         print(f"Error: File not found - {file_path}")
         exit(1)
@@ -17,116 +75,164 @@ def read_input_json(file_path):
         print(f"Error: Invalid JSON format in file - {file_path}")
         exit(1)
 
-def print_technologies(json_data):
-    technologies = [
-        {
-            "Name": tech["name"],
-            "Version": tech["version"] if tech["version"] else "N/A"
-        }
-        for tech in json_data.get("technologies", [])
-        if tech["confidence"] == 100
-    ]
+def categorize(json_data):
+    # Single pass over the technologies, building every bucket the later steps need
+    buckets = {"packages": [], "ui-frameworks": [], "confident": []}
+    for tech in json_data.get("technologies", []):
+        slugs = {category["slug"] for category in tech.get("categories") or () if "slug" in category}
+        if "javascript-libraries" in slugs or "ui-frameworks" in slugs:
+            buckets["packages"].append(tech)
+        else:
+            logger.debug("Skipping package not in 'javascript-libraries' or 'ui-frameworks': %s", tech.get("name"))
+        if "ui-frameworks" in slugs:
+            buckets["ui-frameworks"].append(tech)
+        # A missing confidence is treated as unconfirmed instead of aborting the scan
+        if tech.get("confidence") == 100:
+            buckets["confident"].append(tech)
+    return buckets
+
+
+def print_technologies(buckets):
+    technologies = [(tech.get("name"), tech.get("version") or "N/A") for tech in buckets["confident"]]
     if technologies:
         print("\n[RESULT] Technologies:")
-        print(tabulate(technologies, headers="keys", tablefmt="pretty"))
+        print(tabulate(technologies, headers=("Name", "Version"), tablefmt="pretty"))
         print("\n")
     else:
         print("\n[ERROR] No technologies found with confidence 100.")
 
-def is_package_available(package_name):
+def read_cached_packument(package_name):
     try:
-        subprocess.run(
-            ["npm", "info", package_name],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return True
-    except subprocess.CalledProcessError:
-        return False
-
+        entry = load_json((CACHE_DIR / f"{package_name}.json").read_bytes())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    # An entry from another version of this script, or edited by hand, is a miss, not a crash
+    if not isinstance(entry, dict) or not isinstance(entry.get("fetched_at"), (int, float)) or "versions" not in entry:
+        return None
+    if entry["versions"] is not None and not isinstance(entry["versions"], list):
+        return None
+    return entry
+
+
+def write_cached_packument(package_name, entry):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so concurrent lookups never read a partial entry
+        tmp_path = CACHE_DIR / f"{package_name}.json.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path.write_bytes(dump_json(entry))
+        os.replace(tmp_path, CACHE_DIR / f"{package_name}.json")
+    except OSError:
+        # The cache is only an optimization, a read-only home directory must not fail the scan
+        pass
+
+
+@lru_cache(maxsize=4096)
+def cached_packument(package_name):
+    # Read each disk entry once per run, paired with its age in seconds
+    cached = read_cached_packument(package_name)
+    if cached is None:
+        return None, None
+    return cached, time.time() - cached["fetched_at"]
+
+
+@lru_cache(maxsize=4096)
+def fetch_packument(package_name):
+    cached, age = cached_packument(package_name)
+    if cached and age < CACHE_TTL:
+        # A None entry records that the package is not published, which is just as worth caching
+        return None if cached["versions"] is None else frozenset(cached["versions"])
+
+    # Revalidate a stale entry with a conditional GET so an unchanged packument costs a 304
+    headers = {}
+    if not cached or cached["versions"] is None:
+        cached = None
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
 
-def get_valid_versions(package_name):
     try:
-        result = subprocess.run(
-            ["npm", "view", package_name, "versions", "--json"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        versions = json.loads(result.stdout)
-        return versions if isinstance(versions, list) else []
-    except subprocess.CalledProcessError:
-        print(f"[Error]: Unable to fetch versions for package {package_name}.")
-        return []
-
-
-def filter_packages(json_data):
-    valid_packages = {}
-    for package in json_data.get("technologies", []):
-        if not any(category.get("slug") == "javascript-libraries" for category in package.get("categories", [])):
-            # print(f"[INFO] Skipping package not in 'javascript-libraries': {package['name']}")
-            continue
+        response = session.get(f"{REGISTRY_URL}/{package_name}", headers=headers, timeout=10)
+        # Some private registries do not serve the abbreviated format, retry with the full document
+        if response.status_code in (406, 415):
+            headers["Accept"] = "application/json"
+            response = session.get(f"{REGISTRY_URL}/{package_name}", headers=headers, timeout=10)
+    except requests.exceptions.RequestException as e:
+        logger.warning("Unable to reach the registry for package %s: %s", package_name, e)
+        return None
+
+    if response.status_code == 404:
+        versions = None
+    elif response.status_code == 304 and cached:
+        versions = cached["versions"]
+    elif response.status_code == 200:
+        versions = list(load_json(response.content).get("versions", {}).keys())
+    else:
+        logger.warning("Unable to fetch versions for package %s. Status code: %s", package_name, response.status_code)
+        return None
+
+    write_cached_packument(package_name, {
+        "fetched_at": time.time(),
+        "etag": response.headers.get("ETag", cached.get("etag") if cached else None),
+        "last_modified": response.headers.get("Last-Modified", cached.get("last_modified") if cached else None),
+        "versions": versions
+    })
+    return None if versions is None else frozenset(versions)
+
+
+def check_package(name, versions):
+    # Every version seen for a name is checked, newest-listed first, so the last valid one wins
+    cached, age = cached_packument(name)
+    for version in reversed(versions):
+        if cached and cached["versions"] and version in cached["versions"] and age < VERSION_HIT_TTL:
+            return name, version
+
+        # One memoized lookup answers both availability (None means unpublished) and versions
+        published = fetch_packument(name)
+        if published is not None and version in published:
+            return name, version
+        logger.debug("Skipping package %s with unavailable or invalid version %s", name, version)
+    return None
+
+
+def filter_packages(buckets):
+    # Registry candidates come from javascript-libraries and ui-frameworks, metadata from the latter
+    metadata = [
+        {
+            "name": package.get("name"),
+            "version": package.get("version"),
+            "description": package.get("description"),
+            "slug": "ui-frameworks"
+        }
+        for package in buckets["ui-frameworks"]
+    ]
 
-        name = sanitize_package_name(package["name"])
+    # Several technologies can sanitize to the same name with different versions. They are
+    # grouped per name so a single worker checks them all, which keeps concurrent workers
+    # from fetching the same packument in parallel.
+    candidates = {}
+    for package in buckets["packages"]:
+        name = sanitize_package_name(package.get("name", ""))
         version = package.get("version")
-        if not version:
-            # print(f"[INFO] Skipping package with no version specified: {name}")
+        if not name or not version:
+            logger.debug("Skipping package with no name or version specified: %s", package.get("name"))
             continue
+        versions = candidates.setdefault(name, [])
+        if version not in versions:
+            versions.append(version)
 
-        if is_package_available(name):
-            valid_versions = get_valid_versions(name)
-            if version in valid_versions:
-                valid_packages[name] = version
-            # else:
-                # print(f"[INFO] Skipping package {name} with invalid version {version}. Valid versions: {valid_versions}")
-        # else:
-        #     print(f"[INFO] Skipping unavailable package: {name}")
-    return valid_packages
-
-
-def include_ui_frameworks(json_data, dependencies):
-    for package in json_data.get("technologies", []):
-        # Check if the package belongs to the "ui-frameworks" category
-        if any(category.get("slug") == "ui-frameworks" for category in package.get("categories", [])):
-            name = sanitize_package_name(package.get("name", ""))
-            version = package.get("version")
-
-            if not name:
-                # print(f"[INFO] Skipping UI framework with no name.")
-                continue
-
-            if not version:
-                # print(f"[INFO] Skipping UI framework {name} with no version specified.")
-                continue
-
-            if is_package_available(name):
-                valid_versions = get_valid_versions(name)
-                if version in valid_versions:
-                    dependencies[name] = version
-                    # print(f"[INFO] Included valid UI framework: {name}@{version}")
-            #     else:
-            #         print(f"[INFO] Skipping UI framework {name} with invalid version {version}. Valid versions: {valid_versions}")
-            # else:
-            #     print(f"[INFO] Skipping unavailable UI framework: {name}")
-
-
-def extract_metadata(json_data):
-    metadata = []
-    for package in json_data.get("technologies", []):
-        if any(category.get("slug") == "ui-frameworks" for category in package.get("categories", [])):
-            metadata.append({
-                "name": package.get("name"),
-                "version": package.get("version"),
-                "description": package.get("description"),
-                "slug": "ui-frameworks"
-            })
-    return metadata
+    # Registry lookups are network-bound, so check all names concurrently. map keeps the
+    # input order, so the generated package.json is identical between runs.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = executor.map(lambda candidate: check_package(*candidate), candidates.items())
+        dependencies = dict(result for result in results if result)
+    return dependencies, metadata
 
 
+@lru_cache(maxsize=1024)
 def sanitize_package_name(name):
-    sanitized_name = re.sub(r"[^a-zA-Z0-9-_]", "-", name).lower()
-    # print(f"[INFO] Sanitized package name: {name} -> {sanitized_name}")
+    sanitized_name = _SANITIZE_RE.sub("-", name).lower()
+    logger.debug("Sanitized package name: %s -> %s", name, sanitized_name)
     return sanitized_name
 
 
@@ -141,70 +247,165 @@ def create_package_json(dependencies, metadata, output_path):
         "dependencies": dependencies,
         "metadata": metadata  # Add metadata section for ui-frameworks
     }
-    with open(output_path, "w") as f:
-        json.dump(package_json, f, indent=4)
+    Path(output_path).write_bytes(dump_json(package_json, indent=True))
     print(f"[INFO] Generated {output_path}.")
 
 
 
-def install_dependencies():
-    try:
-        # print("[INFO] Creating package-lock.json...")
-        result_lock = subprocess.run(
-            ["npm", "install", "--package-lock-only"], 
-            stdout=subprocess.PIPE,  # Suppress terminal output
-            stderr=subprocess.PIPE, 
-            text=True, 
-            check=True
-        )
-        
-        # print("[INFO] Installing dependencies...")
-        result_install = subprocess.run(
-            ["npm", "install"], 
-            stdout=subprocess.PIPE,  # Suppress terminal output
-            stderr=subprocess.PIPE, 
-            text=True, 
-            check=False  # Allow errors
+def install_dependencies(cwd):
+    # An identical package.json resolves to the same lockfile, so reuse a recent one
+    digest = hashlib.blake2b(Path(cwd, "package.json").read_bytes(), digest_size=16).hexdigest()
+    cached_lockfile = LOCKFILE_CACHE_DIR / digest / "package-lock.json"
+    if cached_lockfile.exists() and time.time() - cached_lockfile.stat().st_mtime < LOCKFILE_TTL:
+        shutil.copyfile(cached_lockfile, Path(cwd, "package-lock.json"))
+        logger.debug("Reusing cached package-lock.json %s", cached_lockfile)
+        return
+
+    # The advisory check only reads package-lock.json, so resolve the lockfile without
+    # downloading node_modules. Output is streamed to a log file so a verbose run never
+    # fills the pipe, and error lines are picked out as they arrive.
+    errors = []
+    with open(os.path.join(cwd, "npm-install.log"), "w") as log:
+        proc = subprocess.Popen(
+            # The advisory check runs separately, cached metadata is preferred and no
+            # lifecycle scripts need to run just to write a lockfile
+            ["npm", "install", "--package-lock-only", "--no-audit", "--no-fund", "--prefer-offline", "--ignore-scripts"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            cwd=cwd
         )
-        
-        # Optionally, process or log captured outputs if needed
-        if result_install.returncode != 0:
-            print(f"[WARNING] npm install completed with warnings/errors:\n{result_install.stderr}")
-
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Error during npm install: {e.stderr.strip()}")
+        for line in proc.stdout:
+            log.write(line)
+            match = _NPM_ERROR_RE.match(line)
+            if match:
+                errors.append(match.group(0))
+        proc.wait()
+
+    # Without a lockfile there is nothing to audit
+    if proc.returncode != 0:
+        joined_errors = "\n".join(errors)
+        print(f"[ERROR] Error during npm install, see npm-install.log:\n{joined_errors}")
         exit(1)
 
+    try:
+        cached_lockfile.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Path(cwd, "package-lock.json"), cached_lockfile)
+    except OSError:
+        # Like the registry cache, a failed write only costs the next run a resolve
+        pass
+
+
+def read_locked_packages(cwd):
+    # Collect every resolved package, transitive ones included, from package-lock.json
+    lockfile = load_json(Path(cwd, "package-lock.json").read_bytes())
+    packages = {}
+
+    if lockfile.get("lockfileVersion", 1) >= 2:
+        for path, entry in lockfile.get("packages", {}).items():
+            # The "" key is the root project, links have no version of their own
+            if not path or "version" not in entry:
+                continue
+            # Aliased installs record the real package name, the path only holds the alias
+            name = entry.get("name") or path.rsplit("node_modules/", 1)[-1]
+            packages.setdefault(name, set()).add(entry["version"])
+    else:
+        # lockfileVersion 1 (npm 6) only has the nested "dependencies" tree
+        pending = list(lockfile.get("dependencies", {}).items())
+        while pending:
+            name, entry = pending.pop()
+            pending.extend(entry.get("dependencies", {}).items())
+            version = entry.get("version", "")
+            # Aliases are written as "npm:<real-name>@<version>"
+            if version.startswith("npm:"):
+                name, version = version[len("npm:"):].rsplit("@", 1)
+            # file:, git and other non-registry sources have no advisories to look up
+            if not version or ":" in version:
+                continue
+            packages.setdefault(name, set()).add(version)
+
+    return {name: sorted(versions) for name, versions in packages.items()}
+
 
-def run_npm_audit():
+def format_audit_report(packages, advisories):
+    rows = [
+        (name, ", ".join(packages.get(name, ())), advisory.get("severity"), advisory.get("title"),
+         advisory.get("url"), advisory.get("vulnerable_versions"))
+        for name, entries in advisories.items()
+        for advisory in entries
+    ]
+    if not rows:
+        return "found 0 vulnerabilities"
+
+    counts = {}
+    for row in rows:
+        counts[row[2]] = counts.get(row[2], 0) + 1
+    breakdown = ", ".join(
+        f"{counts[severity]} {severity}"
+        for severity in ("info", "low", "moderate", "high", "critical")
+        if counts.get(severity)
+    )
+    table = tabulate(
+        rows,
+        headers=("Package", "Installed", "Severity", "Title", "Advisory", "Vulnerable Versions"),
+        tablefmt="pretty"
+    )
+    return f"{table}\n\n{len(rows)} vulnerabilities ({breakdown})"
+
+
+def query_advisories(cwd):
+    print("[INFO] Checking for vulnerable packages...")
+    packages = read_locked_packages(cwd)
+
+    # npm audit queries this same endpoint, posting to it directly skips a Node.js startup
     try:
-        print("[INFO] Checking for vulnerable packages...")
-        result = subprocess.run(
-            ["npm", "audit"], 
-            stdout=subprocess.PIPE,  # Capture standard output
-            stderr=subprocess.PIPE,  # Capture standard error
-            text=True, 
-            check=False
+        response = session.post(
+            f"{REGISTRY_URL}/-/npm/v1/security/advisories/bulk",
+            data=dump_json(packages),
+            headers={"Accept": "application/json", "Content-Type": "application/json"},
+            timeout=30
         )
+    except requests.exceptions.RequestException as e:
+        print(f"[ERROR] Error querying the npm advisories API: {e}")
+        exit(1)
 
-        # Print the audit results to the terminal
-        print(result.stdout)
-
-        # Save the audit report to a file
-        with open("audit-report.txt", "w") as f:
-            f.write(result.stdout)
-            print("[INFO] Saved audit report to audit-report.txt.")
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Error during npm audit: {e.stderr}")
+    if response.status_code != 200:
+        print(f"[ERROR] Error querying the npm advisories API. Status code: {response.status_code}")
         exit(1)
 
+    # Keep the structured advisories next to the rendered report for other tools to consume
+    Path(cwd, "audit-report.json").write_bytes(response.content)
+
+    # Print the audit results to the terminal
+    report_text = format_audit_report(packages, load_json(response.content))
+    print(report_text)
+
+    # Save the audit report to a file
+    with open(os.path.join(cwd, "audit-report.txt"), "w") as f:
+        f.write(report_text)
+        print("[INFO] Saved audit report to audit-report.txt and audit-report.json.")
+
 
 def main():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Check vulnerabilities in NPM packages based on JSON input.")
     parser.add_argument("input_file", type=str, help="Path to the input JSON file.")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="Print per-package diagnostics.")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="Hide per-package registry warnings.")
     args = parser.parse_args()
 
+    if args.verbose:
+        level = logging.DEBUG
+    elif args.quiet:
+        level = logging.ERROR
+    else:
+        level = logging.WARNING
+    # Only this script's logger follows the flags, so urllib3 stays quiet under --verbose
+    logging.basicConfig(format="[%(levelname)s] %(message)s")
+    logger.setLevel(level)
+
     # Read the input JSON
     json_data = read_input_json(args.input_file)
 
@@ -213,26 +414,22 @@ def main():
     output_folder = os.path.join(os.getcwd(), input_file_name)
     os.makedirs(output_folder, exist_ok=True)
 
-    # Change the working directory to the output folder
-    os.chdir(output_folder)
+    # Sort the technologies once
+    buckets = categorize(json_data)
 
-    # Filter dependencies and include ui-frameworks
-    dependencies = filter_packages(json_data)
-    include_ui_frameworks(json_data, dependencies)
+    # print tech, before the registry lookups so the table shows up immediately
+    print_technologies(buckets)
 
-    # Extract metadata
-    metadata = extract_metadata(json_data)
+    # Filter dependencies, including ui-frameworks, and extract their metadata
+    dependencies, metadata = filter_packages(buckets)
 
     # Create package.json with dependencies and metadata
     package_json_path = os.path.join(output_folder, "package.json")
     create_package_json(dependencies, metadata, package_json_path)
 
-    # print tech
-    print_technologies(json_data)
-
-    # Run npm install and npm audit
-    install_dependencies()
-    run_npm_audit()
+    # Resolve package-lock.json and look up advisories for it
+    install_dependencies(output_folder)
+    query_advisories(output_folder)
 
 
 if __name__ == "__main__":